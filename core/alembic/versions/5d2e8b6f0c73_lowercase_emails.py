@@ -0,0 +1,27 @@
+"""Lowercase stored emails
+
+Revision ID: 5d2e8b6f0c73
+Revises: c41a7f93d5e8
+Create Date: 2026-10-15 12:31:18.554092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8b6f0c73'
+down_revision: Union[str, None] = 'c41a7f93d5e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("UPDATE ethermail_accounts SET email = lower(email) WHERE email IS NOT NULL")
+
+
+def downgrade() -> None:
+    # The original checksum casing is not recoverable and lowercase emails stay valid
+    pass
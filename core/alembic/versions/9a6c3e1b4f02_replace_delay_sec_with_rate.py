@@ -0,0 +1,28 @@
+"""Replace delay_sec with rate
+
+Revision ID: 9a6c3e1b4f02
+Revises: 5d2e8b6f0c73
+Create Date: 2026-10-15 13:14:26.740518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a6c3e1b4f02'
+down_revision: Union[str, None] = '5d2e8b6f0c73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('registration_tasks') as batch_op:
+        batch_op.alter_column('delay_sec', new_column_name='rate', type_=sa.Float(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('registration_tasks') as batch_op:
+        batch_op.alter_column('rate', new_column_name='delay_sec', type_=sa.Integer(), existing_nullable=False)
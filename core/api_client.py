@@ -1,31 +1,68 @@
+import asyncio
+import ssl
+import time
 import traceback
-from datetime import datetime, timezone
-from typing import Optional, Dict, Literal, List, Any
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from datetime import datetime
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Optional, Dict, Literal, List, Any, Tuple, Mapping
 from urllib.parse import urlparse
 
+import certifi
 import httpx
-import jwt
-from eth_account import Account
-from httpx import Response, TimeoutException, ConnectError
-from mnemonic import Mnemonic
+import orjson
+from httpx import TimeoutException, ConnectError, RemoteProtocolError
 from sqlalchemy.ext.asyncio import AsyncSession
 from tenacity import (
     retry,
     stop_after_attempt,
-    wait_exponential,
+    wait_exponential_jitter,
     retry_if_exception_type,
     before_sleep_log
 )
-from web3 import Web3
 from browserforge.headers import HeaderGenerator
 
-from core.database.models import EtherMailAccount
+from core.database.models import EtherMailAccount, utc_now
 from core.logging_config import logger, before_sleep_log_loguru
 
-w3 = Web3()
-
 headers = HeaderGenerator()
 
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36'
+
+# Fallback headers used when browserforge cannot generate a set for the user agent
+_BASE_HEADERS: Mapping[str, str] = MappingProxyType({
+    'accept': 'application/json',
+    'accept-language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'cache-control': 'no-cache',
+    'content-type': 'application/json',
+    'origin': 'https://ethermail.io',
+    'pragma': 'no-cache',
+    'priority': 'u=1, i',
+    'sec-ch-ua': '"Chromium";v="130", "Google Chrome";v="130", "Not?A_Brand";v="99"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin',
+    'sec-gpc': '1',
+})
+
+# Upper bound for parallel message detail requests in search_emails
+MAX_CONCURRENT_DETAILS = 16
+
+# One context with certifi's CA bundle for every client, so it is loaded once; each connection still verifies the server certificate
+_SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
+# Idle pooled clients beyond this many are closed, least recently used first
+MAX_POOLED_CLIENTS = 64
+
+ClientKey = Tuple[Optional[str], Optional[str]]
+
+_CLIENT_CACHE: "OrderedDict[ClientKey, httpx.AsyncClient]" = OrderedDict()
+# Open EthermailAPI instances per cached client; only clients nobody holds are evicted
+_CLIENT_USERS: Dict[ClientKey, int] = {}
+
 class ProxyError(Exception):
     pass
 
@@ -34,6 +71,14 @@ class RegistrationError(Exception):
     pass
 
 
+class ServerError(RegistrationError):
+    """Upstream 5xx or rate limit response, worth retrying"""
+    pass
+
+
+RETRYABLE_ERRORS = (TimeoutException, ConnectError, RemoteProtocolError, ServerError)
+
+
 def _format_proxy(proxy: str, proxy_type: str) -> Dict[str, str]:
     """Formats the proxy into a format understandable for httpx"""
     if not proxy.startswith(('http://', 'https://', 'socks5://')):
@@ -53,35 +98,99 @@ def _format_proxy(proxy: str, proxy_type: str) -> Dict[str, str]:
         }
 
 
+def _build_client(
+        proxy: Optional[Dict[str, str]],
+        client_headers: Dict[str, str],
+        timeout: httpx.Timeout
+) -> httpx.AsyncClient:
+    # Failed connects are retried by the transport, timeouts and 5xx responses by _request
+    transport = httpx.AsyncHTTPTransport(
+        proxy=proxy["https://"] if proxy else None,
+        verify=_SSL_CONTEXT,
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+        retries=2
+    )
+    return httpx.AsyncClient(
+        headers=client_headers,
+        transport=transport,
+        timeout=timeout,
+        # Environment proxies would be mounted over the explicitly proxied transport
+        trust_env=proxy is None,
+        # Shared between accounts, so never keep cookies set by the server
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    )
+
+
+def _get_client(
+        key: ClientKey,
+        proxy: Optional[Dict[str, str]],
+        client_headers: Dict[str, str],
+        timeout: httpx.Timeout
+) -> httpx.AsyncClient:
+    """Returns a pooled client shared by all API instances with the same proxy and user agent.
+
+    Every call must be paired with _release_client once the caller is done with it.
+    """
+    client = _CLIENT_CACHE.get(key)
+    if client is None or client.is_closed:
+        client = _build_client(proxy, client_headers, timeout)
+        _CLIENT_CACHE[key] = client
+    _CLIENT_CACHE.move_to_end(key)
+    _CLIENT_USERS[key] = _CLIENT_USERS.get(key, 0) + 1
+    return client
+
+
+async def _release_client(key: ClientKey) -> None:
+    """Drops one user of a pooled client and closes idle clients over MAX_POOLED_CLIENTS"""
+    users = _CLIENT_USERS.get(key, 0) - 1
+    if users > 0:
+        _CLIENT_USERS[key] = users
+    else:
+        _CLIENT_USERS.pop(key, None)
+
+    excess = len(_CLIENT_CACHE) - MAX_POOLED_CLIENTS
+    if excess <= 0:
+        return
+    idle = [cached for cached in _CLIENT_CACHE if cached not in _CLIENT_USERS][:excess]
+    for cached in idle:
+        await _CLIENT_CACHE.pop(cached).aclose()
+
+
+async def close_clients() -> None:
+    """Close every pooled client, called on application shutdown"""
+    clients = list(_CLIENT_CACHE.values())
+    _CLIENT_CACHE.clear()
+    _CLIENT_USERS.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def get_token_expiration(token: str) -> int:
+    """Returns the exp claim of a JWT as a unix timestamp"""
+    import jwt
+    decoded = jwt.decode(token, options={"verify_signature": False})
+    exp_timestamp = decoded.get('exp')
+
+    if not exp_timestamp:
+        raise Exception("Invalid token format: no expiration time")
+
+    return int(exp_timestamp)
+
+
 class EthermailAPI:
     def __init__(
             self,
             proxy: Optional[str] = None,
             proxy_type: Literal["http", "socks5"] = "socks5",
-            user_agent: Optional[str] = None
+            user_agent: Optional[str] = None,
+            pooled: bool = True
     ):
+        user_agent = user_agent if isinstance(user_agent, str) else DEFAULT_USER_AGENT
         try:
-            self.headers = headers.generate(user_agent=user_agent if isinstance(user_agent, str) else 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36')
+            self.headers = headers.generate(user_agent=user_agent)
         except:
-            self.headers = {
-                'accept': 'application/json',
-                'accept-language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-                'cache-control': 'no-cache',
-                'content-type': 'application/json',
-                'cookie': '',
-                'origin': 'https://ethermail.io',
-                'pragma': 'no-cache',
-                'priority': 'u=1, i',
-                'sec-ch-ua': '"Chromium";v="130", "Google Chrome";v="130", "Not?A_Brand";v="99"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"Windows"',
-                'sec-fetch-dest': 'empty',
-                'sec-fetch-mode': 'cors',
-                'sec-fetch-site': 'same-origin',
-                'sec-gpc': '1',
-                'user-agent': user_agent if isinstance(user_agent,
-                                                       str) else 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36'
-            }
+            self.headers = {**_BASE_HEADERS, 'user-agent': user_agent}
         self.base_url = "https://ethermail.io/api"
         self.timeout = httpx.Timeout(30.0)
 
@@ -90,22 +199,46 @@ class EthermailAPI:
         else:
             self.proxy = None
 
+        # One-off sessions (registration with a random user agent) would only fill the cache, so they get their own client
+        self._client_key: Optional[ClientKey] = None
+        if pooled:
+            self._client_key = (self.proxy["https://"] if self.proxy else None, user_agent)
+            self._client = _get_client(self._client_key, self.proxy, self.headers, self.timeout)
+        else:
+            self._client = _build_client(self.proxy, self.headers, self.timeout)
+        self._closed = False
+        self._token: Optional[str] = None
+
+    async def close(self) -> None:
+        """Release the instance; a pooled client stays open for reuse, a dedicated one is closed"""
+        self.delete_auth_token()
+        if self._closed:
+            return
+        self._closed = True
+        if self._client_key is not None:
+            await _release_client(self._client_key)
+        else:
+            await self._client.aclose()
+
+    async def __aenter__(self) -> "EthermailAPI":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
     async def set_auth_token(self, token: str, account: EtherMailAccount, db: AsyncSession) -> None:
         """Set auth token with expiration check and auto-refresh if needed"""
         try:
             if account:
-                decoded = jwt.decode(token, options={"verify_signature": False})
-                exp_timestamp = decoded.get('exp')
-
-                if not exp_timestamp:
-                    raise Exception("Invalid token format: no expiration time")
-
+                if account.jwt_exp is None:
+                    account.jwt_exp = get_token_expiration(token)
+                    db.add(account)
+                    await db.commit()
 
-                exp_time = datetime.fromtimestamp(exp_timestamp, tz=timezone.utc)
-                time_left = exp_time - datetime.now(timezone.utc)
+                time_left = account.jwt_exp - int(time.time())
 
                 # If there is less than an hour left, update the token
-                if time_left.total_seconds() < 3600:
+                if time_left < 3600:
                     logger.info("Token expires soon, refreshing...")
 
                     _, nonce = await self.get_nonce(account.wallet_address.lower())
@@ -117,58 +250,66 @@ class EthermailAPI:
                     )
 
                     account.jwt_token = new_token
-                    account.last_used = datetime.utcnow()
+                    account.jwt_exp = get_token_expiration(new_token)
+                    account.last_used = utc_now()
                     db.add(account)
                     await db.commit()
 
                     token = new_token
 
-            self.headers['cookie'] = f"token={token};"
+            self._token = token
 
         except Exception as e:
             logger.error(f"Error setting auth token: {str(e)}")
             raise
 
     def delete_auth_token(self) -> None:
-        """Clear the authentication token in cookie headers."""
-        self.headers['cookie'] = ''
+        """Clear the authentication token sent in cookie headers."""
+        self._token = None
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2, min=4, max=10),
-        retry=retry_if_exception_type((TimeoutException, ConnectError, Exception)),
+        wait=wait_exponential_jitter(initial=1, max=10, jitter=2),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        reraise=True,
     )
-    async def _request(self, method: str, endpoint: str, **kwargs) -> Response:
+    async def _request(self, method: str, endpoint: str, **kwargs) -> Any:
+        """Sends a request to the EtherMail API and returns the decoded JSON body"""
         url = f"{self.base_url}/{endpoint}"
-        logger.debug(f"\nStarting request: {method.upper()} {url} with headers: {self.headers} and proxy: {self.proxy}")
+        logger.debug("\nStarting request: {} {} with headers: {} and proxy: {}", method.upper(), url, self.headers, self.proxy)
         if 'json' in kwargs:
             logger.debug(f"Request JSON payload: {kwargs['json']}\n")
         if 'params' in kwargs:
             logger.debug(f"Request query parameters: {kwargs['params']}\n")
 
+        request_headers = dict(kwargs.pop('headers', {}))
+        if 'json' in kwargs:
+            kwargs['content'] = orjson.dumps(kwargs.pop('json'))
+            request_headers['content-type'] = 'application/json'
+        if self._token:
+            request_headers['cookie'] = f"token={self._token};"
+        if request_headers:
+            kwargs['headers'] = request_headers
+
         try:
-            async with httpx.AsyncClient(
-                    headers=self.headers,
-                    proxies=self.proxy,
-                    verify=False,
-                    timeout=self.timeout
-            ) as client:
-                response = await getattr(client, method.lower())(url, **kwargs)
-                logger.debug(f"Received response with status code: {response.status_code}")
-                response.raise_for_status()
-
-                try:
-                    response_json = response.json()
-                    logger.debug(f"Response JSON: {response_json}")
-                except Exception:
-                    logger.error("Response did not contain valid JSON")
-                    raise RegistrationError("Invalid JSON response")
-                return response
+            response = await getattr(self._client, method.lower())(url, **kwargs)
+            logger.debug(f"Received response with status code: {response.status_code}")
+            response.raise_for_status()
+
+            try:
+                data = orjson.loads(response.content)
+            except orjson.JSONDecodeError:
+                logger.error("Response did not contain valid JSON")
+                raise RegistrationError("Invalid JSON response")
+            logger.debug("Response JSON: {}", data)
+            return data
 
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error: {str(e)}; Status code: {e.response.status_code}; Response: {e.response.text}")
+            if e.response.status_code >= 500 or e.response.status_code == 429:
+                raise ServerError(f"HTTP {e.response.status_code}: {e.response.text}")
             raise RegistrationError(f"HTTP {e.response.status_code}: {e.response.text}")
-        except (TimeoutException, ConnectError) as e:
+        except (TimeoutException, ConnectError, RemoteProtocolError) as e:
             logger.warning(f"Request timed out or connection error: {str(e)}")
             raise
         except Exception as e:
@@ -177,22 +318,19 @@ class EthermailAPI:
 
     async def test_proxy(self) -> bool:
         try:
-            async with httpx.AsyncClient(
-                    proxies=self.proxy,
-                    verify=False,
-                    timeout=httpx.Timeout(10.0)
-            ) as client:
-                response = await client.get("http://ip-api.com/json/")
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"Proxy info: {data}")
-                return True
+            response = await self._client.get("http://ip-api.com/json/", timeout=httpx.Timeout(10.0))
+            response.raise_for_status()
+            data = response.json()
+            logger.info(f"Proxy info: {data}")
+            return True
         except Exception as e:
             logger.info(f"Proxy test failed: {str(e)}")
             return False
 
     @staticmethod
-    async def create_wallet() -> tuple[str, str, str]:
+    def _create_wallet_sync() -> tuple[str, str, str]:
+        from eth_account import Account
+        from mnemonic import Mnemonic
         Account.enable_unaudited_hdwallet_features()
         # Generating a mnemonic phrase
         mnemo = Mnemonic("english")
@@ -203,6 +341,11 @@ class EthermailAPI:
 
         return account.address, account.key.hex(), mnemonic_phrase
 
+    @classmethod
+    async def create_wallet(cls) -> tuple[str, str, str]:
+        # Key derivation is CPU bound, keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, cls._create_wallet_sync)
+
     # @staticmethod
     # async def create_signature(private_key: str, nonce: str) -> str:
     #     account = w3.eth.account.from_key(private_key)
@@ -214,54 +357,44 @@ class EthermailAPI:
     #     return signed_message.signature.hex()
 
     @staticmethod
-    async def create_signature(private_key: str, message: str) -> str:
+    def create_signature(private_key: str, message: str) -> str:
         from eth_account import Account
-        import eth_utils
+        from Crypto.Hash import keccak
         # Convert the message to bytes and add the ethereum signing prefix
-        msg_bytes = eth_utils.to_bytes(text=message)
-        prefix = "\x19Ethereum Signed Message:\n" + str(len(msg_bytes))
-        prefixed_msg = eth_utils.to_bytes(text=prefix) + msg_bytes
+        msg_bytes = message.encode('utf-8')
+        prefixed_msg = b"\x19Ethereum Signed Message:\n%d%s" % (len(msg_bytes), msg_bytes)
 
         # Create a hash
-        msg_hash = eth_utils.keccak(prefixed_msg)
+        msg_hash = keccak.new(digest_bits=256, data=prefixed_msg).digest()
 
         # Sign
         signed = Account._sign_hash(msg_hash, private_key)
 
         # Collecting a signature
-        signature = eth_utils.to_hex(signed.signature)
+        signature = "0x" + bytes(signed.signature).hex()
 
         return signature
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2),
-        retry=retry_if_exception_type(Exception),
-    )
     async def get_nonce(self, address: str):
         try:
-            response = await self._request(
+            result = await self._request(
                 "POST",
                 "auth/nonce",
                 json={"walletAddress": address}
             )
-            result = response.json()
             return result.get('success', False), result.get('nonce', 1)
         except Exception as e:
             logger.error(f"Nonce request failed: {str(e)}")
             raise
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2),
-        retry=retry_if_exception_type(Exception),
-    )
     async def register(self, address: str, private_key: str, nonce_number: int) -> str:
         try:
             message = f"By signing this message you agree to the Terms and Conditions and Privacy Policy\n\nNONCE: {nonce_number}"
 
-            signature = await self.create_signature(private_key, message)
-            response = await self._request(
+            signature = await asyncio.get_running_loop().run_in_executor(
+                None, self.create_signature, private_key, message
+            )
+            data = await self._request(
                 "POST",
                 "auth/login",
                 json={
@@ -270,27 +403,19 @@ class EthermailAPI:
                     'signature': signature
                 }
             )
-            data = response.json()
             if 'token' not in data:
-                print(f"Server response: {data}")
                 raise RegistrationError("No token in response")
             return data['token']
         except Exception as e:
             logger.error(f"Registration failed: {str(e)}")
             raise
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2),
-        retry=retry_if_exception_type(Exception),
-    )
     async def get_communities_ids(self, filter_var: str = "show", limit_var: int = 12) -> list[Any]:
         try:
-            response = await self._request(
+            data = await self._request(
                 "GET",
                 f"communities?filter={filter_var}&limit={limit_var}",
             )
-            data = response.json()
             communities_ids = []
             for community in data:
                 communities_ids.append(community.get("tenant_id"))
@@ -300,15 +425,10 @@ class EthermailAPI:
             logger.error(f"Communities failed: {str(e)}")
             raise
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2),
-        retry=retry_if_exception_type(Exception),
-    )
     async def onboarding(self, communities_ids: List[str], email: str = None) -> str:
         try:
 
-            response = await self._request(
+            data = await self._request(
                 "POST",
                 "users/onboarding",
                 json={
@@ -316,7 +436,6 @@ class EthermailAPI:
                     'email': email
                 }
             )
-            data = response.json()
             return data.get('success', False)
         except Exception as e:
             logger.error(f"Registration failed: {str(e)}")
@@ -324,12 +443,11 @@ class EthermailAPI:
 
     async def get_mailboxes(self) -> dict:
         """Get list of mailboxes"""
-        response = await self._request("GET", "mailboxes")
-        return response.json()
+        return await self._request("GET", "mailboxes")
 
     async def search_messages(self, mailbox_id: str, page: int = 1, limit: int = 10, query: str = "") -> dict:
         """Search messages in mailbox"""
-        response = await self._request(
+        return await self._request(
             "POST",
             "messages/search",
             json={
@@ -341,15 +459,13 @@ class EthermailAPI:
                 "query": query
             }
         )
-        return response.json()
 
     async def get_message_details(self, mailbox_id: str, message_id: int) -> dict:
         """Get detailed message information"""
-        response = await self._request(
+        return await self._request(
             "GET",
             f"mailboxes/{mailbox_id}/messages/{message_id}"
         )
-        return response.json()
 
     async def search_emails(
             self,
@@ -375,7 +491,7 @@ class EthermailAPI:
                 query=subject if subject else ""
             )
 
-            detailed_messages = []
+            filtered = []
             for msg in messages["results"]:
                 if from_address and msg["from"]["address"] != from_address:
                     continue
@@ -386,8 +502,23 @@ class EthermailAPI:
                 if date_to and datetime.fromisoformat(msg["date"]) > date_to:
                     continue
 
-                message_data = await self.get_message_details(inbox["id"], msg["id"])
+                filtered.append(msg)
+
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_DETAILS)
 
+            async def fetch_details(message_id: int) -> dict:
+                async with semaphore:
+                    return await self.get_message_details(inbox["id"], message_id)
+
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    tasks = [tg.create_task(fetch_details(msg["id"])) for msg in filtered]
+            except ExceptionGroup as eg:
+                # Surface the original error (e.g. an HTTP 401) rather than the group wrapper
+                raise eg.exceptions[0] from None
+
+            detailed_messages = []
+            for message_data in (task.result() for task in tasks):
                 detailed_messages.append({
                     "id": message_data["id"],
                     "from": message_data["from"]["address"],
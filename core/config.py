@@ -1,18 +1,18 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Annotated, Union
 
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env")
+
     API_KEY: str
     API_KEY_NAME: str = "X-API-Key"
     DOCS: Union[str, bool] = False
     REDOC: Union[str, bool] = False
     OPENAPI: Union[str, bool] = False
-
-
-    class Config:
-        env_file = ".env"
+    MAX_CONCURRENT_REGISTRATIONS: int = 10
+    TASK_RETENTION_HOURS: int = 24
 
     def _convert_to_bool(self, value: Union[str, bool]) -> bool:
         if isinstance(value, str):
@@ -1,8 +1,7 @@
 import os
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.future import select
 from sqlalchemy import insert, update, delete
 
@@ -13,8 +12,28 @@ from sqlalchemy import insert, update, delete
 db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/test.db'))
 DATABASE_URL = fr"sqlite+aiosqlite:///{db_path}"
 
-engine = create_async_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Rows per registration writer flush; one flush is sent as a single INSERT ... RETURNING page
+INSERT_BATCH_SIZE = 100
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    connect_args={"check_same_thread": False},
+    insertmanyvalues_page_size=INSERT_BATCH_SIZE,
+)
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL lets readers run during writes, NORMAL syncs once per checkpoint instead of every commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
 
 
 def create_db():
@@ -1,11 +1,16 @@
 # models.py
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Float
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from datetime import datetime, timezone
 
 Base = declarative_base()
 
 
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, the form SQLite DateTime columns store and return"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class EtherMailAccount(Base):
     __tablename__ = "ethermail_accounts"
 
@@ -13,12 +18,27 @@ class EtherMailAccount(Base):
     wallet_address = Column(String, unique=True)
     mnemonic = Column(String)
     private_key = Column(String)
-    email = Column(String, nullable=True)
+    email = Column(String, nullable=True, index=True)
     jwt_token = Column(String)
+    jwt_exp = Column(Integer, nullable=True)
     proxy = Column(String, nullable=True)
     user_agent = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_used = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utc_now)
+    last_used = Column(DateTime, default=utc_now)
+
 
-    class Config:
-        orm_mode = True
+class RegistrationTaskRecord(Base):
+    __tablename__ = "registration_tasks"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False)
+    proxies = Column(JSON, nullable=False)
+    count = Column(Integer, nullable=False)
+    rate = Column(Float, nullable=False)
+    completed_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    results = Column(JSON, default=list)
+    errors = Column(JSON, default=list)
+    owner_pid = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=utc_now)
+    finished_at = Column(DateTime, nullable=True)
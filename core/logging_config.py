@@ -41,7 +41,8 @@ def setup_logging():
         sys.stdout,
         format=log_format,
         level="INFO",
-        colorize=True
+        colorize=True,
+        enqueue=True
     )
 
     logger.add(
@@ -53,6 +54,7 @@ def setup_logging():
         compression="zip",
         backtrace=True,
         diagnose=True,
+        enqueue=True,
     )
 
 
@@ -1,105 +1,212 @@
 import asyncio
 import random
-from datetime import datetime
-from typing import List
+from typing import List, AsyncIterator
 from fastapi import APIRouter
+from aiolimiter import AsyncLimiter
 from fake_useragent import UserAgent
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from sqlalchemy import select, func
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from core.api_client import EthermailAPI
-from core.database.connect import get_db
-from core.database.models import EtherMailAccount
+from sqlalchemy import select, func, insert, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.api_client import EthermailAPI, get_token_expiration
+from core.config import settings
+from core.database.connect import get_db, async_session, INSERT_BATCH_SIZE
+from core.database.models import EtherMailAccount, utc_now
 from core.dependencies import verify_api_key
 from core.ip import validate_proxy
 from core.schemas import TaskResponse, CreateMultipleAccountsRequest, CreateSingleAccountRequest, TaskStatusResponse, \
-    AccountResponse, EmailSearchResponse, EmailSearchRequest, UpdateProxiesRequest
+    AccountResponse, EmailSearchResponse, EmailSearchRequest, UpdateProxiesRequest, ConcurrencyRequest, \
+    ConcurrencyResponse
 
-from core.task_manager import TaskManager, TaskStatus
+from core.task_manager import TaskManager, TaskStatus, RegistrationTask
 
-task_manager = TaskManager()
+task_manager = TaskManager(settings.MAX_CONCURRENT_REGISTRATIONS, settings.TASK_RETENTION_HOURS)
 ETHERMAIL_DOMAIN = "ethermail.io"
+UPDATE_CHUNK_SIZE = 10_000
 ether_router = APIRouter()
+user_agents = UserAgent(browsers=["chrome", "edge", "firefox", "safari"],
+                        os=["windows", "macos", "linux"],
+                        platforms=["pc"])
 
-async def register_account(proxy: str, db: AsyncSession):
+async def register_account(proxy: str) -> dict:
+    """Registers a new account and returns its column values, without saving it"""
     try:
-        ua = UserAgent(browsers=["chrome", "edge", "firefox", "safari"],
-                       os=["windows", "macos", "linux"],
-                       platforms=["pc"])
-        user_agent = ua.random
-        api_client = EthermailAPI(proxy=proxy, user_agent=user_agent)
-
-        address, private_key, mnemonic = await api_client.create_wallet()
+        user_agent = user_agents.random
+        async with EthermailAPI(proxy=proxy, user_agent=user_agent, pooled=False) as api_client:
+            address, private_key, mnemonic = await api_client.create_wallet()
 
-        _, nonce = await api_client.get_nonce(address.lower())
+            _, nonce = await api_client.get_nonce(address.lower())
 
-        token = await api_client.register(address.lower(), private_key, nonce)
+            token = await api_client.register(address.lower(), private_key, nonce)
 
-        await api_client.set_auth_token(token, None, db)
-        communities_ids = await api_client.get_communities_ids()
+            await api_client.set_auth_token(token, None, None)
+            communities_ids = await api_client.get_communities_ids()
 
-        if not await api_client.onboarding(communities_ids=random.sample(communities_ids, k=3)):
-            logger.info("Error onboarding")
+            if not await api_client.onboarding(communities_ids=random.sample(communities_ids, k=3)):
+                logger.info("Error onboarding")
 
         logger.info("Register suc")
 
-        account = EtherMailAccount(
-            wallet_address=address,
-            private_key=private_key,
-            mnemonic=mnemonic,
-            jwt_token=token,
-            email=f"{address}@{ETHERMAIL_DOMAIN}",
-            proxy=proxy,
-            user_agent=user_agent,
-            last_used=datetime.utcnow()
-        )
-        db.add(account)
-        await db.commit()
-        await db.refresh(account)
+        # The wallet is already registered upstream, so never lose it over an unreadable token;
+        # set_auth_token fills jwt_exp in on first use
+        try:
+            jwt_exp = get_token_expiration(token)
+        except Exception as e:
+            logger.warning(f"Could not read token expiration for {address}: {str(e)}")
+            jwt_exp = None
 
         return {
-            "id": account.id,
             "wallet_address": address,
-            "token": token
+            "private_key": private_key,
+            "mnemonic": mnemonic,
+            "jwt_token": token,
+            "jwt_exp": jwt_exp,
+            # Stored lowercased so lookups can use the plain email index
+            "email": f"{address.lower()}@{ETHERMAIL_DOMAIN}",
+            "proxy": proxy,
+            "user_agent": user_agent
         }
     except Exception as e:
         logger.error(f"Error registering account: {str(e)}")
         raise
 
 
-async def process_registration_task(task_id: str, db: AsyncSession):
-    task = task_manager.get_task(task_id)
+def describe_save_error(e: Exception) -> str:
+    """Error text without the bound statement parameters, which carry keys, mnemonics and tokens"""
+    if isinstance(e, DBAPIError) and e.orig is not None:
+        return f"{type(e.orig).__name__}: {e.orig}"
+    return type(e).__name__
+
+
+async def save_accounts(accounts: List[dict], session_factory: async_sessionmaker) -> List[int]:
+    """Inserts registered accounts in one statement and returns their ids in the same order"""
+    async with session_factory() as session:
+        try:
+            result = await session.execute(
+                insert(EtherMailAccount).returning(EtherMailAccount.id, sort_by_parameter_order=True),
+                accounts
+            )
+            ids = result.scalars().all()
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+    return ids
+
+
+async def process_registration_task(task_id: str, session_factory: async_sessionmaker):
+    task = await task_manager.get_task(task_id)
     if not task:
         return
 
     task.status = TaskStatus.IN_PROGRESS
+    await task_manager.save_task(task_id)
 
-    semaphore = asyncio.Semaphore(10)
+    try:
+        await run_registrations(task_id, task, session_factory)
+    except Exception as e:
+        logger.error(f"Registration task {task_id} failed: {str(e)}")
+        task.errors.append(str(e))
+        task.status = TaskStatus.FAILED
+    finally:
+        await task_manager.finish_task(task_id)
+
+
+async def write_registered_accounts(
+        queue: asyncio.Queue,
+        task_id: str,
+        task: RegistrationTask,
+        session_factory: async_sessionmaker,
+        batch_size: int = INSERT_BATCH_SIZE,
+        flush_ms: int = 500
+):
+    """Single writer: collects up to batch_size accounts or waits flush_ms, then inserts them at once"""
+    loop = asyncio.get_running_loop()
+    while True:
+        accounts = [await queue.get()]
+        deadline = loop.time() + flush_ms / 1000
+        while len(accounts) < batch_size:
+            try:
+                accounts.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+            except TimeoutError:
+                break
+
+        now = utc_now()
+        for account in accounts:
+            account["last_used"] = now
 
-    async def register_with_proxy(proxy: str, number_task: int, delay_sec: int):
-        async with semaphore:
+        try:
             try:
-                await asyncio.sleep(delay_sec / 0.9)
-                result = await register_account(proxy, db)
+                saved = list(zip(await save_accounts(accounts, session_factory), accounts))
+            except Exception as e:
+                # These accounts exist upstream and their keys live only here, so one bad row
+                # or a locked database must not drop the whole batch
+                logger.warning(
+                    f"Batch insert of {len(accounts)} accounts failed, saving one by one: {describe_save_error(e)}"
+                )
+                saved = []
+                for account in accounts:
+                    try:
+                        saved.extend(zip(await save_accounts([account], session_factory), [account]))
+                    except Exception as e:
+                        error = f"Failed to save account {account['wallet_address']}: {describe_save_error(e)}"
+                        logger.error(error)
+                        task.failed_count += 1
+                        task.errors.append(error)
+
+            for account_id, account in saved:
                 task.completed_count += 1
-                task.results.append(result)
+                task.results.append({
+                    "id": account_id,
+                    "wallet_address": account["wallet_address"],
+                    "token": account["jwt_token"]
+                })
+        finally:
+            # Publish progress so workers polling this task from the database see it move;
+            # results and errors are written once, when the task finishes
+            try:
+                await task_manager.save_progress(task_id)
+            except Exception as e:
+                logger.error(f"Error saving progress of task {task_id}: {str(e)}")
+            for _ in accounts:
+                queue.task_done()
+
+
+async def run_registrations(task_id: str, task: RegistrationTask, session_factory: async_sessionmaker):
+    queue = asyncio.Queue()
+    writer = asyncio.create_task(write_registered_accounts(queue, task_id, task, session_factory))
+
+    # Token bucket: one registration may start every 1 / rate seconds, independent of concurrency
+    limiter = AsyncLimiter(1, 1 / task.rate)
+
+    async def register_with_proxy(proxy: str, number_task: int):
+        # Take the token first so a slowly rated task does not hold global slots while it waits
+        await limiter.acquire()
+        async with task_manager.registration_slot():
+            try:
+                await queue.put(await register_account(proxy))
             except Exception as e:
                 task.failed_count += 1
                 task.errors.append(str(e))
 
-    tasks = []
+    # The endpoints guarantee count <= len(proxies); sampling leaves task.proxies untouched
+    selected = random.sample(task.proxies, task.count)
 
-    proxies_for_reg = task.proxies
-    random.shuffle(proxies_for_reg)
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for i, proxy in enumerate(selected):
+                tg.create_task(register_with_proxy(proxy, i))
 
-    for i in range(task.count):
-        if i < len(proxies_for_reg):
-            tasks.append(register_with_proxy(proxies_for_reg[i], i, task.delay_sec))
+        # Wait until the writer has saved everything that was queued
+        await queue.join()
+    finally:
+        writer.cancel()
 
-    await asyncio.gather(*tasks)
-    task.status = TaskStatus.COMPLETED
+    if task.status != TaskStatus.FAILED:
+        task.status = TaskStatus.COMPLETED
 
 
 @ether_router.post(
@@ -110,8 +217,7 @@ async def process_registration_task(task_id: str, db: AsyncSession):
     dependencies=[Depends(verify_api_key)]
 )
 async def create_accounts(
-        request: CreateMultipleAccountsRequest,
-        db: AsyncSession = Depends(get_db)
+        request: CreateMultipleAccountsRequest
 ):
     if not request.proxies:
         raise HTTPException(status_code=400, detail="No proxies provided")
@@ -119,8 +225,8 @@ async def create_accounts(
     if request.count > len(request.proxies):
         raise HTTPException(status_code=400, detail="Not enough proxies for requested account count")
 
-    task_id = task_manager.create_task(request.proxies, request.count, request.delay_sec)
-    asyncio.create_task(process_registration_task(task_id, db))
+    task_id = await task_manager.create_task(request.proxies, request.count, request.rate)
+    asyncio.create_task(process_registration_task(task_id, async_session))
 
     return TaskResponse(task_id=task_id)
 
@@ -133,14 +239,27 @@ async def create_accounts(
     dependencies=[Depends(verify_api_key)]
 )
 async def create_account(
-        request: CreateSingleAccountRequest,
-        db: AsyncSession = Depends(get_db)
+        request: CreateSingleAccountRequest
 ):
-    task_id = task_manager.create_task([request.proxy], 1)
-    asyncio.create_task(process_registration_task(task_id, db))
+    task_id = await task_manager.create_task([request.proxy], 1)
+    asyncio.create_task(process_registration_task(task_id, async_session))
     return TaskResponse(task_id=task_id)
 
 
+@ether_router.post(
+    "/concurrency",
+    response_model=ConcurrencyResponse,
+    summary="Set registration concurrency",
+    description="Change how many accounts this worker registers at the same time, applied to its running tasks. "
+                "The limit is kept per worker process: with several workers, each one that should change "
+                "must receive the request, and the total is the sum of their limits",
+    dependencies=[Depends(verify_api_key)]
+)
+async def set_concurrency(request: ConcurrencyRequest):
+    await task_manager.set_concurrency(request.max_concurrency)
+    return ConcurrencyResponse(max_concurrency=task_manager.concurrency)
+
+
 @ether_router.get(
     "/task/{task_id}",
     response_model=TaskStatusResponse,
@@ -149,7 +268,7 @@ async def create_account(
     dependencies=[Depends(verify_api_key)]
 )
 async def get_task_status(task_id: str):
-    task = task_manager.get_task(task_id)
+    task = await task_manager.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -172,10 +291,21 @@ async def get_task_status(task_id: str):
     description="Get list of all registered accounts",
     dependencies=[Depends(verify_api_key)]
 )
-async def get_accounts(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(EtherMailAccount))
-    accounts = result.scalars().all()
-    return [AccountResponse.from_orm(acc) for acc in accounts]
+async def get_accounts():
+    async def stream_accounts() -> AsyncIterator[str]:
+        # The request session is closed before a streamed body is sent, so use a dedicated one
+        async with async_session() as session:
+            # Only the response columns, as plain rows without ORM identity tracking
+            result = await session.stream(
+                select(*(getattr(EtherMailAccount, name) for name in AccountResponse.model_fields))
+            )
+            separator = "["
+            async for row in result:
+                yield separator + AccountResponse.model_construct(**row._mapping).model_dump_json()
+                separator = ","
+            yield "[]" if separator == "[" else "]"
+
+    return StreamingResponse(stream_accounts(), media_type="application/json")
 
 
 @ether_router.get(
@@ -194,7 +324,7 @@ async def get_account(account_id: int, db: AsyncSession = Depends(get_db)):
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    return AccountResponse.from_orm(account)
+    return AccountResponse.model_validate(account)
 
 
 @ether_router.get(
@@ -210,26 +340,25 @@ async def get_emails(
 ):
     try:
         result = await db.execute(
-            select(EtherMailAccount).filter(func.lower(EtherMailAccount.email) == request.address.lower())
+            select(EtherMailAccount).filter(EtherMailAccount.email == request.address.lower())
         )
         account = result.scalar_one_or_none()
 
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
 
-        api_client = EthermailAPI(
-            proxy=account.proxy,
-            user_agent=account.user_agent
-        )
-
-        await api_client.set_auth_token(account.jwt_token, account, db)
+        async with EthermailAPI(
+                proxy=account.proxy,
+                user_agent=account.user_agent
+        ) as api_client:
+            await api_client.set_auth_token(account.jwt_token, account, db)
 
-        messages = await api_client.search_emails(
-            subject=request.subject,
-            from_address=request.from_address,
-            date_from=request.date_from,
-            date_to=request.date_to
-        )
+            messages = await api_client.search_emails(
+                subject=request.subject,
+                from_address=request.from_address,
+                date_from=request.date_from,
+                date_to=request.date_to
+            )
 
         return EmailSearchResponse(
             total=len(messages),
@@ -256,32 +385,61 @@ async def update_proxies(
         raise HTTPException(status_code=400, detail="No proxies provided")
 
 
-    result = await db.execute(select(EtherMailAccount))
-    accounts = result.scalars().all()
+    counts = await db.execute(select(func.count(EtherMailAccount.id), func.max(EtherMailAccount.id)))
+    total_accounts, max_id = counts.one()
 
-    if len(accounts) == 0:
+    if total_accounts == 0:
         raise HTTPException(status_code=404, detail="No accounts found")
 
 
-    if len(request.proxies) < len(accounts):
+    if len(request.proxies) < total_accounts:
         raise HTTPException(status_code=400, detail="Not enough proxies for the accounts")
 
 
-    valid_proxies = []
-    for proxy in request.proxies:
-        if request.validate:
-            if await validate_proxy(proxy):
-                valid_proxies.append(proxy)
-        else:
-            valid_proxies.append(proxy)
+    if request.validate:
+        semaphore = asyncio.Semaphore(50)
+
+        async def check(proxy: str) -> bool:
+            async with semaphore:
+                return await validate_proxy(proxy)
+
+        checks = await asyncio.gather(*(check(proxy) for proxy in request.proxies))
+        valid_proxies = [proxy for proxy, is_valid in zip(request.proxies, checks) if is_valid]
+    else:
+        valid_proxies = list(request.proxies)
 
-    if len(valid_proxies) < len(accounts):
+    if len(valid_proxies) < total_accounts:
         raise HTTPException(status_code=400, detail="Not enough valid proxies for the accounts")
 
-    for i, account in enumerate(accounts):
-        account.proxy = valid_proxies[i]
-        account.last_used = datetime.utcnow()
+    now = utc_now()
+    proxies = iter(valid_proxies)
+    columns = [getattr(EtherMailAccount, name) for name in AccountResponse.model_fields]
+    updated = []
+    last_id = 0
+    while True:
+        # Keyset pagination, bounded by max_id so accounts created meanwhile cannot exhaust the proxies
+        result = await db.execute(
+            select(*columns)
+            .where(EtherMailAccount.id > last_id, EtherMailAccount.id <= max_id)
+            .order_by(EtherMailAccount.id)
+            .limit(UPDATE_CHUNK_SIZE)
+        )
+        accounts = [dict(row._mapping) for row in result]
+        if not accounts:
+            break
+
+        for account in accounts:
+            account["proxy"] = next(proxies)
+            account["last_used"] = now
+
+        # Bulk UPDATE by primary key: one statement executed with every parameter set
+        await db.execute(
+            update(EtherMailAccount),
+            [{"id": account["id"], "proxy": account["proxy"], "last_used": now} for account in accounts]
+        )
+        await db.commit()
 
-    await db.commit()
+        updated.extend(AccountResponse.model_construct(**account) for account in accounts)
+        last_id = accounts[-1]["id"]
 
-    return [AccountResponse.from_orm(account) for account in accounts]
\ No newline at end of file
+    return updated
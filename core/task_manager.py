@@ -1,9 +1,17 @@
 # task_manager.py
-from typing import Dict, Optional, List
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, List, AsyncIterator
 import asyncio
 from enum import Enum
 
+import psutil
+from sqlalchemy import select, update, delete
+
+from core.database.connect import async_session
+from core.database.models import RegistrationTaskRecord, utc_now
+
 
 class TaskStatus(Enum):
     PENDING = "pending"
@@ -13,30 +21,183 @@ class TaskStatus(Enum):
 
 
 class RegistrationTask:
-    def __init__(self, proxies: List[str], count: int = 1, delay_sec: int = 5):
+    def __init__(self, proxies: List[str], count: int = 1, rate: float = 1.0):
         self.proxies = proxies
         self.count = count
-        self.delay_sec = delay_sec
+        self.rate = rate
         self.status = TaskStatus.PENDING
-        self.created_at = datetime.utcnow()
+        self.created_at = utc_now()
+        self.finished_at: Optional[datetime] = None
         self.completed_count = 0
         self.failed_count = 0
         self.results = []
         self.errors = []
 
+    @classmethod
+    def from_record(cls, record: RegistrationTaskRecord) -> "RegistrationTask":
+        task = cls(record.proxies, record.count, record.rate)
+        task.status = TaskStatus(record.status)
+        task.created_at = record.created_at
+        task.finished_at = record.finished_at
+        task.completed_count = record.completed_count
+        task.failed_count = record.failed_count
+        task.results = record.results
+        task.errors = record.errors
+        return task
+
+
+def _parse_task_id(task_id: str) -> Optional[int]:
+    prefix, _, number = task_id.partition("_")
+    if prefix != "task" or not number.isdigit():
+        return None
+    return int(number)
+
 
 class TaskManager:
-    def __init__(self):
+    """Keeps task state in the database so it survives restarts and is visible to every worker.
+
+    Tasks running in this process are also held in memory; their counters are written back after every
+    saved batch and the full state, with results, when they finish. Finished tasks are kept for the
+    retention period only.
+    """
+
+    def __init__(self, max_concurrency: int = 10, retention_hours: int = 24):
         self.tasks: Dict[str, RegistrationTask] = {}
-        self._task_counter = 0
+        self._retention = timedelta(hours=retention_hours)
+        self._cmax = max_concurrency
+        self._inflight = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return self._cmax
 
-    def create_task(self, proxies: List[str], count: int = 1, delay_sec: int = 5) -> str:
-        self._task_counter += 1
-        task_id = f"task_{self._task_counter}"
-        self.tasks[task_id] = RegistrationTask(proxies, count)
+    @asynccontextmanager
+    async def registration_slot(self) -> AsyncIterator[None]:
+        """Waits until fewer than the configured number of registrations are running in this process"""
+        async with self._cond:
+            while self._inflight >= self._cmax:
+                await self._cond.wait()
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._inflight -= 1
+                self._cond.notify(1)
+
+    async def set_concurrency(self, max_concurrency: int) -> None:
+        """Changes the registration limit; running registrations are never interrupted"""
+        async with self._cond:
+            self._cmax = max_concurrency
+            self._cond.notify_all()
+
+    async def create_task(self, proxies: List[str], count: int = 1, rate: float = 1.0) -> str:
+        task = RegistrationTask(proxies, count, rate)
+        async with async_session() as session:
+            record = RegistrationTaskRecord(
+                status=task.status.value,
+                proxies=task.proxies,
+                count=task.count,
+                rate=task.rate,
+                completed_count=0,
+                failed_count=0,
+                results=[],
+                errors=[],
+                owner_pid=os.getpid(),
+                created_at=task.created_at
+            )
+            session.add(record)
+            await session.commit()
+            # The autoincrement primary key gives a unique id across workers
+            task_id = f"task_{record.id}"
+
+        self.tasks[task_id] = task
         return task_id
 
-    def get_task(self, task_id: str) -> Optional[RegistrationTask]:
-        return self.tasks.get(task_id)
+    async def get_task(self, task_id: str) -> Optional[RegistrationTask]:
+        task = self.tasks.get(task_id)
+        if task:
+            return task
+
+        record_id = _parse_task_id(task_id)
+        if record_id is None:
+            return None
+
+        async with async_session() as session:
+            record = await session.get(RegistrationTaskRecord, record_id)
+            return RegistrationTask.from_record(record) if record else None
+
+    async def save_progress(self, task_id: str) -> None:
+        """Writes only the status and counters of a running task, cheap enough to call after every batch"""
+        task = self.tasks[task_id]
+        async with async_session() as session:
+            await session.execute(
+                update(RegistrationTaskRecord)
+                .where(RegistrationTaskRecord.id == _parse_task_id(task_id))
+                .values(
+                    status=task.status.value,
+                    completed_count=task.completed_count,
+                    failed_count=task.failed_count
+                )
+            )
+            await session.commit()
+
+    async def save_task(self, task_id: str) -> None:
+        """Writes the in-memory state of a running task to the database"""
+        task = self.tasks[task_id]
+        async with async_session() as session:
+            await session.execute(
+                update(RegistrationTaskRecord)
+                .where(RegistrationTaskRecord.id == _parse_task_id(task_id))
+                .values(
+                    status=task.status.value,
+                    completed_count=task.completed_count,
+                    failed_count=task.failed_count,
+                    results=task.results,
+                    errors=task.errors,
+                    finished_at=task.finished_at
+                )
+            )
+            await session.commit()
+
+    async def finish_task(self, task_id: str) -> None:
+        """Saves the final state and stops tracking the task in memory"""
+        self.tasks[task_id].finished_at = utc_now()
+        await self.save_task(task_id)
+        self.tasks.pop(task_id, None)
+        await self.purge_expired_tasks()
 
+    async def purge_expired_tasks(self) -> None:
+        """Deletes tasks finished longer ago than the retention period, with their proxies and tokens"""
+        async with async_session() as session:
+            await session.execute(
+                delete(RegistrationTaskRecord).where(
+                    RegistrationTaskRecord.finished_at < utc_now() - self._retention
+                )
+            )
+            await session.commit()
 
+    async def fail_interrupted_tasks(self) -> None:
+        """Marks tasks whose owning process is gone as failed, called on startup"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(RegistrationTaskRecord.id, RegistrationTaskRecord.owner_pid).where(
+                    RegistrationTaskRecord.status.in_([TaskStatus.PENDING.value, TaskStatus.IN_PROGRESS.value])
+                )
+            )
+            interrupted = [
+                row.id for row in result
+                if row.owner_pid is None or row.owner_pid == os.getpid() or not psutil.pid_exists(row.owner_pid)
+            ]
+            if interrupted:
+                await session.execute(
+                    update(RegistrationTaskRecord)
+                    .where(RegistrationTaskRecord.id.in_(interrupted))
+                    .values(
+                        status=TaskStatus.FAILED.value,
+                        errors=["Interrupted by service restart"],
+                        finished_at=utc_now()
+                    )
+                )
+                await session.commit()
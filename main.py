@@ -1,4 +1,5 @@
 # main.py
+import asyncio
 import logging
 
 import psutil
@@ -6,16 +7,20 @@ import platform
 import sys
 from datetime import datetime, timedelta
 import time
+from contextlib import asynccontextmanager
+
 import httpx
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.api_client import close_clients, DEFAULT_USER_AGENT
 from core.config import settings
-from core.database.models import EtherMailAccount
+from core.database.models import EtherMailAccount, utc_now
 from core.dependencies import verify_api_key
-from core.routes.ether import ether_router
+from core.routes.ether import ether_router, task_manager
 from core.schemas import ServiceStatus, ServiceStats, SystemInfo
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from core.database.connect import get_db
 from core.logging_config import setup_logging, logger
 
@@ -24,15 +29,60 @@ setup_logging()
 START_TIME = datetime.now()
 VERSION = "1.0.0"
 
+PROBE_TTL = 30
+_probe_cache = {"ts": float("-inf"), "value": "unknown"}
+_probe_lock = asyncio.Lock()
+
+# Kept open for the app lifetime so health probes reuse a warm connection
+HTTP_CLIENT = httpx.AsyncClient(
+    timeout=5.0,
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=20),
+    headers={"user-agent": DEFAULT_USER_AGENT}
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await task_manager.fail_interrupted_tasks()
+    await task_manager.purge_expired_tasks()
+    yield
+    await HTTP_CLIENT.aclose()
+    await close_clients()
+
+
 app = FastAPI(title="EtherMail API",
               description="API для работы с EtherMail",
               version="1.0.0",
+              lifespan=lifespan,
+              default_response_class=ORJSONResponse,
               docs_url=settings.docs_url,
               redoc_url=settings.redoc_url,
               openapi_url=settings.openapi_url)
 app.include_router(ether_router, prefix="")
 
 
+async def check_ethermail() -> str:
+    """Returns the cached ethermail.io status, probing at most once per PROBE_TTL seconds"""
+    if time.monotonic() - _probe_cache["ts"] < PROBE_TTL:
+        return _probe_cache["value"]
+
+    async with _probe_lock:
+        # Another request may have refreshed the value while we waited
+        if time.monotonic() - _probe_cache["ts"] >= PROBE_TTL:
+            _probe_cache["value"] = await probe_ethermail()
+            _probe_cache["ts"] = time.monotonic()
+    return _probe_cache["value"]
+
+
+async def probe_ethermail() -> str:
+    try:
+        response = await HTTP_CLIENT.get("https://ethermail.io/")
+        return "ok" if response.status_code == 200 else "error"
+    except Exception:
+        return "error"
+
+
 @app.get(
     "/status",
     response_model=ServiceStatus,
@@ -42,38 +92,26 @@ app.include_router(ether_router, prefix="")
 )
 async def get_service_status(db: AsyncSession = Depends(get_db)):
     try:
-        total_accounts = await db.execute(
-            select(func.count(EtherMailAccount.id))
-        )
-        total_accounts = total_accounts.scalar()
-
-        current_time = datetime.utcnow()
-        active_accounts = await db.execute(
-            select(func.count(EtherMailAccount.id)).where(
-                EtherMailAccount.last_used >= current_time - timedelta(hours=24)
-            )
-        )
-        active_accounts = active_accounts.scalar()
-
-        accounts_24h = await db.execute(
-            select(func.count(EtherMailAccount.id)).where(
-                EtherMailAccount.created_at >= current_time - timedelta(hours=24)
-            )
+        current_time = utc_now()
+        cutoff = current_time - timedelta(hours=24)
+        # One round-trip for all three counters, run while the upstream probe is in flight
+        counts, ethermail_status = await asyncio.gather(
+            db.execute(
+                select(
+                    func.count(EtherMailAccount.id),
+                    func.count(EtherMailAccount.id).filter(EtherMailAccount.last_used >= cutoff),
+                    func.count(EtherMailAccount.id).filter(EtherMailAccount.created_at >= cutoff)
+                )
+            ),
+            check_ethermail()
         )
-        accounts_24h = accounts_24h.scalar()
+        total_accounts, active_accounts, accounts_24h = counts.one()
 
         cpu_usage = psutil.cpu_percent()
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
 
-        dependencies_status = {}
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get("https://ethermail.io/", headers={
-                    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"})
-                dependencies_status["ethermail_api"] = "ok" if response.status_code == 200 else "error"
-        except Exception:
-            dependencies_status["ethermail_api"] = "error"
+        dependencies_status = {"ethermail_api": ethermail_status}
 
         return ServiceStatus(
             status="ok",